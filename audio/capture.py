@@ -1,12 +1,39 @@
 # audio/capture.py
 import asyncio
+import logging
+import math
 import numpy as np
 import pyaudio
 import threading
-import traceback
 from aiortc import MediaStreamTrack
 from av import AudioFrame
 from config import Config
+from console import say
+from audio.portaudio import get_pyaudio
+from audio.ring_buffer import FrameRingBuffer
+
+logger = logging.getLogger(__name__)
+
+def _wake(waiter, result):
+    """Resolve the future recv() is parked on, unless it was already resolved."""
+    if not waiter.done():
+        waiter.set_result(result)
+
+class AudioFramePool:
+    """
+    A fixed rotation of preallocated AudioFrames, handed out oldest-first.
+    A frame is only reused after ``size - 1`` newer ones, which gives the
+    encoder plenty of headroom before its buffer is overwritten.
+    """
+    def __init__(self, size, factory):
+        self.frames = [factory() for _ in range(size)]
+        self.index = 0
+
+    def acquire(self):
+        """Return the next frame in the rotation to be filled in place."""
+        frame = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        return frame
 
 class MicrophoneStreamTrack(MediaStreamTrack):
     """
@@ -16,225 +43,270 @@ class MicrophoneStreamTrack(MediaStreamTrack):
 
     def __init__(self):
         super().__init__()
-        self.pyaudio_instance = pyaudio.PyAudio()
-        self.frames_queue = asyncio.Queue()
+        self.pyaudio_instance = get_pyaudio()
+        
+        # Lock-free hand-off between the PyAudio thread and recv()
+        self.ring = FrameRingBuffer(Config.CAPTURE_RING_SIZE, Config.CHUNK_SIZE * Config.CHANNELS)
+        self.waiter = None  # Future recv() is parked on while the ring is empty
+        self.dropped_blocks = 0  # Written only by the recorder thread
+        self.reported_drops = 0  # Written only by recv()
+        self.last_drop_report = 0.0  # loop.time() of the last overflow warning
         self.is_recording = False
         self.thread = None
         self.stream = None
-        self.loop = asyncio.get_event_loop()
+        self.loop = None  # Captured in start(), from inside the running loop
         
         # Push-to-talk state
         self.suspended = True  # Start suspended (muted)
-        self.force_stop = False  # Flag to force stop recording
+        self.stop_event = threading.Event()  # Set by stop() to end the recorder thread
         
         # Timestamp tracking for proper PTS
         self.samples_sent = 0
-        self.start_time = None
+        self.frame_duration = Config.CHUNK_SIZE / Config.SAMPLE_RATE  # seconds of audio per frame
+        self.next_frame_time = 0.0  # loop.time() deadline for the next muted silence frame
         
         # Audio level logging counter
         self.audio_level_counter = 0
+        
+        # Debug log intervals, in blocks/samples, so they stay time-based whatever CHUNK_SIZE is
+        blocks_per_second = max(1, Config.SAMPLE_RATE // Config.CHUNK_SIZE)
+        self.level_log_blocks = blocks_per_second  # ~1 second
+        self.frame_log_samples = Config.CHUNK_SIZE * blocks_per_second * 2  # ~2 seconds
+        self.silence_log_samples = Config.CHUNK_SIZE * blocks_per_second * 5  # ~5 seconds
+        
+        # Output frames for real audio are recycled instead of allocated per recv()
+        self.frame_pool = AudioFramePool(Config.FRAME_POOL_SIZE, self._make_frame)
+        
+        # Silence never changes, so it gets its own frame that is zeroed exactly once
+        self.silence_frame = self._make_frame()
+        self.silence_frame.planes[0].update(bytes(self.silence_frame.planes[0].buffer_size))
+
+    @staticmethod
+    def _make_frame():
+        """Allocate an s16 AudioFrame sized for one capture block."""
+        frame = AudioFrame(
+            format='s16',
+            layout='mono' if Config.CHANNELS == 1 else 'stereo',
+            samples=Config.CHUNK_SIZE
+        )
+        frame.sample_rate = Config.SAMPLE_RATE
+        return frame
 
     def suspend(self, suspended=True):
         """Suspend or resume the microphone track"""
         self.suspended = suspended
         status = "muted" if suspended else "unmuted"
-        print(f"🎤 Microphone {status}")
+        say(f"🎤 Microphone {status}")
         
         if not suspended:
-            print("🎤 Ready for new audio input")
+            say("🎤 Ready for new audio input")
+
+    def _open_stream(self):
+        """Open and start a blocking-mode PyAudio input stream."""
+        stream = self.pyaudio_instance.open(
+            format=pyaudio.paInt16,
+            channels=Config.CHANNELS,
+            rate=Config.SAMPLE_RATE,
+            input=True,
+            frames_per_buffer=Config.CHUNK_SIZE,
+        )
+        stream.start_stream()
+        return stream
 
     def _start_recorder(self):
         """
-        This method runs in a separate thread to manage the PyAudio stream,
-        which is necessary because PyAudio's stream operations are blocking.
+        This method runs in a separate thread and pulls audio from PyAudio in
+        blocking mode. stream.read() waits inside PortAudio with the GIL
+        released, so no Python code ever runs on PortAudio's own audio thread.
         """
         try:
-            self.stream = self.pyaudio_instance.open(
-                format=pyaudio.paInt16,
-                channels=Config.CHANNELS,
-                rate=Config.SAMPLE_RATE,
-                input=True,
-                frames_per_buffer=Config.CHUNK_SIZE,
-                stream_callback=self._pyaudio_callback,
-            )
-            self.stream.start_stream()
-            print("🎤 PyAudio recording started in a separate thread.")
+            self.stream = self._open_stream()
+            say("🎤 PyAudio recording started in a separate thread.")
             
-            # Keep the thread alive while recording.
-            # Only check self.is_recording, not stream.is_active() to avoid premature closure
-            while self.is_recording and not self.force_stop:
-                # Check if stream has an error and try to recover
-                if not self.stream.is_active():
-                    print("⚠️ PyAudio stream became inactive, attempting to restart...")
+            while not self.stop_event.is_set():
+                try:
+                    data = self.stream.read(Config.CHUNK_SIZE, exception_on_overflow=False)
+                except Exception as read_error:
+                    # The device went away or errored - try to recover
+                    say(f"⚠️ PyAudio stream read failed ({read_error}), attempting to restart...")
                     try:
                         self.stream.stop_stream()
                         self.stream.close()
+                        self.stream = None
                         
                         # Recreate the stream
-                        self.stream = self.pyaudio_instance.open(
-                            format=pyaudio.paInt16,
-                            channels=Config.CHANNELS,
-                            rate=Config.SAMPLE_RATE,
-                            input=True,
-                            frames_per_buffer=Config.CHUNK_SIZE,
-                            stream_callback=self._pyaudio_callback,
-                        )
-                        self.stream.start_stream()
-                        print("✅ PyAudio stream restarted successfully")
+                        self.stream = self._open_stream()
+                        say("✅ PyAudio stream restarted successfully")
                     except Exception as restart_error:
-                        print(f"❌ Failed to restart PyAudio stream: {restart_error}")
+                        say(f"❌ Failed to restart PyAudio stream: {restart_error}")
                         break
+                    continue
                 
-                threading.Event().wait(0.1)
+                self._on_audio_block(data)
 
         except Exception as e:
-            print(f"❌ PyAudio thread error: {e}")
+            say(f"❌ PyAudio thread error: {e}")
         finally:
-            # Only close if we're actually stopping, not due to stream becoming inactive
-            if self.stream and (self.force_stop or not self.is_recording):
+            if self.stream:
                 try:
                     self.stream.stop_stream()
                     self.stream.close()
-                    print("🎤 PyAudio stream closed.")
+                    say("🎤 PyAudio stream closed.")
                 except Exception as e:
-                    print(f"⚠️ Error closing PyAudio stream: {e}")
+                    say(f"⚠️ Error closing PyAudio stream: {e}")
 
-    def _pyaudio_callback(self, in_data, frame_count, time_info, status):
+    def _on_audio_block(self, in_data):
         """
-        Callback for the PyAudio stream. It's called by PyAudio in its own thread
-        whenever new audio data is available.
+        Called from the recorder thread for every block read from the microphone.
+        While muted the block is simply discarded so the device buffer keeps draining.
         """
-        # Check for stream errors
-        if status:
-            print(f"⚠️ PyAudio callback status: {status}")
-        
-        # Always capture audio, but queue it appropriately
         if not self.suspended and self.is_recording:
             # When not suspended, send audio immediately
             try:
-                self.loop.call_soon_threadsafe(self.frames_queue.put_nowait, in_data)
-                
-                # Calculate and print audio level for debugging
-                audio_data = np.frombuffer(in_data, dtype=np.int16)
-                rms = np.sqrt(np.mean(audio_data.astype(np.float64)**2))
-                normalized_rms = rms / 32768.0
-                
-                # Log audio level occasionally to reduce spam
-                self.audio_level_counter += 1
-                if normalized_rms > 0.001 and self.audio_level_counter % 8 == 0:  # Every ~1 second at 8kHz
-                    print(f"🎤 Live audio level: {normalized_rms:.4f}")
+                # Only wake the event loop if recv() is actually parked. While it
+                # is busy, blocks pile up in the ring and are drained back-to-back
+                # on its next calls without any further wakeups.
+                if self.ring.write(in_data):
+                    waiter = self.waiter
+                    if waiter is not None:
+                        self.loop.call_soon_threadsafe(_wake, waiter, True)
+                else:
+                    # recv() has stalled and the ring is full - drop rather than block
+                    # the audio thread or let mic latency grow without bound
+                    self.dropped_blocks += 1
             except Exception as e:
-                print(f"⚠️ Error in audio callback: {e}")
-                
-        return (None, pyaudio.paContinue)
+                say(f"⚠️ Error handling audio block: {e}")
 
     async def start(self):
         """
         Starts the recording by spawning a new thread for the PyAudio stream.
         """
         if not self.is_recording:
+            # The recorder thread posts wakeups to this loop, so it must be the
+            # one actually running recv() - not whatever get_event_loop() returns
+            self.loop = asyncio.get_running_loop()
             self.is_recording = True
-            self.force_stop = False
+            self.stop_event.clear()
             self.thread = threading.Thread(target=self._start_recorder, daemon=True)
             self.thread.start()
-            print("🎤 Recording thread started.")
+            say("🎤 Recording thread started.")
 
     def stop(self):
         """
-        Stops the recording thread and cleans up PyAudio resources.
+        Stops the recording thread. The recorder closes its own stream; the
+        shared PyAudio instance is released at exit.
         """
         if self.is_recording:
-            print("🛑 Stopping audio recording...")
+            say("🛑 Stopping audio recording...")
             self.is_recording = False
-            self.force_stop = True
+            self.stop_event.set()
             
             if self.thread:
                 self.thread.join(timeout=2)  # Wait for the thread to finish
-                
-            if self.pyaudio_instance:
-                try:
-                    self.pyaudio_instance.terminate()
-                    print("🎤 PyAudio resources released.")
-                except Exception as e:
-                    print(f"⚠️ Error terminating PyAudio: {e}")
 
     async def recv(self):
         """
         This method is called by aiortc to get the next audio frame.
-        It waits for a new frame to be available in the queue.
-        """
-        # Initialize start time on first call
-        if self.start_time is None:
-            import time
-            self.start_time = time.time()
+        It waits for a new block to be available in the ring buffer.
         
+        The common path is a ring peek, one memcpy into a pooled frame, two
+        int updates and a clock read - keep it that way, it runs for every
+        frame sent.
+        """
         try:
             # Try to get real audio data first
             try:
-                data = await asyncio.wait_for(self.frames_queue.get(), timeout=0.02)
-                self.frames_queue.task_done()
+                data = self.ring.peek()
+                while data is None:
+                    # Publish that we're parked, then re-check so a block written
+                    # in between isn't missed
+                    waiter = self.loop.create_future()
+                    self.waiter = waiter
+                    data = self.ring.peek()
+                    if data is None:
+                        now = self.loop.time()
+                        if self.suspended:
+                            # Muted: wait until the next frame deadline, so idle silence
+                            # goes out at real-time rate instead of being generated and
+                            # encoded several times faster than the microphone could
+                            # produce audio. Deadlines advance by a fixed step, so time
+                            # spent encoding doesn't accumulate as drift.
+                            if self.next_frame_time < now - self.frame_duration:
+                                self.next_frame_time = now  # Resync after a stall
+                            self.next_frame_time += self.frame_duration
+                            deadline = self.next_frame_time
+                        else:
+                            # Live: PortAudio often hands over blocks in pairs or fours,
+                            # so a one-frame gap is normal - only fill in silence if the
+                            # microphone has actually stalled
+                            deadline = now + self.frame_duration * Config.CAPTURE_STALL_FRAMES
+                        timer = self.loop.call_at(deadline, _wake, waiter, False)
+                        try:
+                            woken = await waiter
+                        finally:
+                            timer.cancel()
+                            self.waiter = None
+                        data = self.ring.peek()
+                        if data is None and not woken:
+                            raise asyncio.TimeoutError
+                    else:
+                        self.waiter = None
                 
-                # Create AudioFrame from real data
-                audio_array = np.frombuffer(data, dtype=np.int16)
-                reshaped = audio_array.reshape(Config.CHANNELS, -1)
+                # A stall drops blocks on every read - summarize rather than warn per frame
+                if self.dropped_blocks != self.reported_drops and \
+                        self.loop.time() - self.last_drop_report >= Config.DROP_REPORT_INTERVAL:
+                    self.last_drop_report = self.loop.time()
+                    say(f"⚠️ Capture ring full - dropped {self.dropped_blocks - self.reported_drops} audio block(s)")
+                    self.reported_drops = self.dropped_blocks
                 
-                frame = AudioFrame.from_ndarray(
-                    reshaped,
-                    format='s16', 
-                    layout='mono' if Config.CHANNELS == 1 else 'stereo'
-                )
-                frame.sample_rate = Config.SAMPLE_RATE
+                # Copy the block straight into a recycled frame
+                frame = self.frame_pool.acquire()
+                frame.planes[0].update(data)
+                
+                # Audio level for debugging - computed here rather than on the
+                # recorder thread, and only for the blocks that get logged
+                self.audio_level_counter += 1
+                if self.audio_level_counter % self.level_log_blocks == 0 and logger.isEnabledFor(logging.DEBUG):
+                    # Sum of squares as a single float32 dot product (BLAS sdot).
+                    # An int32 accumulator would overflow on a loud block.
+                    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+                    normalized_rms = math.sqrt(np.dot(samples, samples) / samples.size) / 32768.0
+                    if normalized_rms > 0.001:
+                        logger.debug("🎤 Live audio level: %.4f", normalized_rms)
+                self.ring.advance()
                 
                 # Set proper timestamp
                 frame.pts = self.samples_sent
                 self.samples_sent += Config.CHUNK_SIZE
+                self.next_frame_time = self.loop.time()  # Silence after muting follows on from here
                 
                 # Log occasionally to avoid spam - every ~2 seconds when speaking
-                if self.samples_sent % (Config.CHUNK_SIZE * 16) == 0:  # Every ~2 seconds at 8kHz
-                    print(f"🎤 Real audio frame: {Config.CHUNK_SIZE} samples, pts={frame.pts}")
+                if self.samples_sent % self.frame_log_samples == 0:
+                    logger.debug("🎤 Real audio frame: %d samples, pts=%d", Config.CHUNK_SIZE, frame.pts)
                 return frame
                 
             except asyncio.TimeoutError:
                 # Send silence frame with proper timestamp
-                silence_data = np.zeros(Config.CHUNK_SIZE, dtype=np.int16)
-                frame = AudioFrame.from_ndarray(
-                    silence_data.reshape(Config.CHANNELS, -1),
-                    format='s16', 
-                    layout='mono' if Config.CHANNELS == 1 else 'stereo'
-                )
-                frame.sample_rate = Config.SAMPLE_RATE
-                
-                # Set proper timestamp
-                frame.pts = self.samples_sent
-                self.samples_sent += Config.CHUNK_SIZE
+                frame = self._next_silence_frame()
                 
                 # Only log occasionally to avoid spam
-                if self.samples_sent % (Config.CHUNK_SIZE * 50) == 0:  # Every ~5 seconds at 8kHz
-                    print(f"🔇 Silence frame: pts={frame.pts}")
+                if self.samples_sent % self.silence_log_samples == 0:
+                    logger.debug("🔇 Silence frame: pts=%d", frame.pts)
                 
                 return frame
                 
         except Exception as e:
-            print(f"❌ Error in recv(): {e}")
+            say(f"❌ Error in recv(): {e}")
             
             # Return silence on any exception
-            try:
-                silence_data = np.zeros(Config.CHUNK_SIZE, dtype=np.int16)
-                frame = AudioFrame.from_ndarray(
-                    silence_data.reshape(Config.CHANNELS, -1),
-                    format='s16', 
-                    layout='mono' if Config.CHANNELS == 1 else 'stereo'
-                )
-                frame.sample_rate = Config.SAMPLE_RATE
-                
-                # Set proper timestamp
-                frame.pts = self.samples_sent
-                self.samples_sent += Config.CHUNK_SIZE
-                
-                return frame
-            except Exception as silence_error:
-                print(f"💥 CRITICAL: Cannot create silence frame: {silence_error}")
-                raise
+            return self._next_silence_frame()
+
+    def _next_silence_frame(self):
+        """Stamp the cached silence frame with the next pts - no PCM is touched."""
+        frame = self.silence_frame
+        frame.pts = self.samples_sent
+        self.samples_sent += Config.CHUNK_SIZE
+        return frame
 
 class AudioCapture:
     """
@@ -247,11 +319,12 @@ class AudioCapture:
         """Create and start the microphone track."""
         self.track = MicrophoneStreamTrack()
         await self.track.start()
-        print("🎤 Audio capture track created and started.")
+        say("🎤 Audio capture track created and started.")
         return self.track
     
     async def stop_recording(self):
         """Stop recording audio."""
         if self.track:
-            self.track.stop()
-            print("🎤 Audio capture track stopped.")
+            # stop() joins the recorder thread - keep that wait off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.track.stop)
+            say("🎤 Audio capture track stopped.")
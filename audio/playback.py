@@ -2,31 +2,77 @@
 import asyncio
 import numpy as np
 import pyaudio
-from av import AudioFrame
 from config import Config
+from console import say
 from aiortc.mediastreams import MediaStreamError
+from audio.portaudio import get_pyaudio
+from audio.ring_buffer import ByteRingBuffer
+
+# A wait this long for the next frame is a pause in the remote audio
+# (e.g. between responses), not network jitter
+STREAM_GAP = 0.5
+
+# Exceptions from track.recv() that just mean the remote audio is over.
+# ConnectionError, BrokenPipeError and ConnectionResetError are all OSErrors.
+_END_OF_STREAM = (MediaStreamError, OSError, asyncio.TimeoutError, StopAsyncIteration)
+
+# Messages that mark an otherwise unrecognised exception as end-of-stream
+_EOF_PHRASES = (
+    "connection closed", "stream ended", "eof", "end of file",
+    "no more data", "stream closed", "track ended"
+)
 
 class AudioPlayback:
     def __init__(self):
         self.is_playing = False
         self.pyaudio_instance = None
         self.output_stream = None
+        self.scratch = None  # Reusable int16 buffer for float -> int16 conversion
+        
+        # PCM waiting for the output callback. play_track() only ever copies into it.
+        # Both are sized in _open_output(), once the decoded format is known.
+        self.sample_rate = Config.SAMPLE_RATE
+        self.frame_bytes = Config.CHANNELS * 2  # bytes per int16 sample frame
+        self.ring = None
+        self.silence = b''  # Cached zero block handed to the device while priming
+        self.dropped_bytes = 0  # Oldest PCM overwritten because the ring was full
+        self.reported_drop_bytes = 0
+        self.last_drop_report = 0.0
+        
+        # Adaptive jitter pre-buffer (in frames), grown on underruns and decayed back
+        self.prebuffer = Config.PLAYBACK_PREBUFFER_MIN
+        self.last_underrun = 0.0
+        self.primed = False  # Written only by play_track()
+        self.underruns = 0  # Written only by the output callback
         
     def start_playback(self):
-        """Initialize audio playback using PyAudio"""
+        """
+        Initialize audio playback using PyAudio. The output stream itself is
+        opened on the first received frame, at the decoder's rate and channel
+        count (48 kHz stereo for Opus, 8 kHz mono for PCMU).
+        """
         try:
-            self.pyaudio_instance = pyaudio.PyAudio()
-            self.output_stream = self.pyaudio_instance.open(
-                format=pyaudio.paInt16,
-                channels=Config.CHANNELS,
-                rate=Config.SAMPLE_RATE,
-                output=True,
-                frames_per_buffer=Config.CHUNK_SIZE
-            )
-            print("🔊 Playback initialized")
+            self.primed = False
+            self.pyaudio_instance = get_pyaudio()
+            say("🔊 Playback initialized")
             self.is_playing = True
         except Exception as e:
-            print(f"❌ Error initializing playback: {e}")
+            say(f"❌ Error initializing playback: {e}")
+    
+    def _open_output(self, sample_rate, channels):
+        """Open the callback-driven output stream for the remote track's format"""
+        self.sample_rate = sample_rate
+        self.frame_bytes = channels * 2
+        self.ring = ByteRingBuffer(int(sample_rate * Config.PLAYBACK_RING_SECONDS) * self.frame_bytes)
+        self.output_stream = self.pyaudio_instance.open(
+            format=pyaudio.paInt16,
+            channels=channels,
+            rate=sample_rate,
+            output=True,
+            frames_per_buffer=round(Config.CHUNK_SIZE * sample_rate / Config.SAMPLE_RATE),  # same duration as a capture block
+            stream_callback=self._output_callback
+        )
+        say(f"🔊 Audio output opened: {sample_rate} Hz, {channels} channel(s)")
     
     def stop_playback(self):
         """Stop audio playback and cleanup resources"""
@@ -37,90 +83,158 @@ class AudioPlayback:
                 try:
                     self.output_stream.stop_stream()
                     self.output_stream.close()
-                    print("🔊 Audio output stream closed")
-                except Exception as e:
-                    print(f"⚠️ Error closing audio stream: {e}")
-                    
-            if self.pyaudio_instance:
-                try:
-                    self.pyaudio_instance.terminate()
-                    print("🔊 PyAudio playback terminated")
+                    self.output_stream = None
+                    say("🔊 Audio output stream closed")
                 except Exception as e:
-                    print(f"⚠️ Error terminating PyAudio: {e}")
+                    say(f"⚠️ Error closing audio stream: {e}")
     
+    @staticmethod
+    def _passthrough(audio_array):
+        return audio_array
+
+    def _float_to_int16(self, audio_array):
+        """Scale float samples to int16 in place into the reusable scratch buffer"""
+        if self.scratch is None or self.scratch.shape != audio_array.shape:
+            self.scratch = np.empty(audio_array.shape, dtype=np.int16)
+        np.multiply(audio_array, 32767, out=self.scratch, casting='unsafe')
+        return self.scratch
+
+    def _select_converter(self, audio_array):
+        """Pick the PCM conversion once - the decoded format doesn't change mid-session"""
+        if audio_array.dtype == np.int16:
+            return self._passthrough
+        return self._float_to_int16
+
+    def _output_callback(self, in_data, frame_count, time_info, status):
+        """
+        Runs on PortAudio's audio thread: hand the device the next block from
+        the ring, zero-padded if it ran dry. Keep this to a copy - anything
+        slower here is an audible glitch.
+        """
+        wanted = frame_count * self.frame_bytes
+        if not self.primed:
+            # Still filling the pre-buffer - play silence and leave the ring alone
+            if len(self.silence) != wanted:
+                self.silence = bytes(wanted)
+            return (self.silence, pyaudio.paContinue)
+        
+        data, filled = self.ring.read(wanted)
+        if filled < wanted or status & pyaudio.paOutputUnderflow:
+            self.underruns += 1
+        return (data, pyaudio.paContinue)
+
+    def _report_drops(self, now):
+        """Summarize audio dropped since the last report, at most once per DROP_REPORT_INTERVAL"""
+        dropped_ms = (self.dropped_bytes - self.reported_drop_bytes) * 1000 // (self.frame_bytes * self.sample_rate)
+        say(f"⚠️ Playback ring full - dropped {dropped_ms} ms of audio "
+            f"({self.dropped_bytes} bytes this session)")
+        self.reported_drop_bytes = self.dropped_bytes
+        self.last_drop_report = now
+
+    def _on_underrun(self, now):
+        """Double the jitter pre-buffer after an underrun, up to the configured cap"""
+        self.prebuffer = min(self.prebuffer * 2, Config.PLAYBACK_PREBUFFER_MAX)
+        self.last_underrun = now
+        say(f"⚠️ Playback underrun - pre-buffering {self.prebuffer} frames")
+
+    def _maybe_shrink_prebuffer(self, now):
+        """Halve the jitter pre-buffer again once playback has been clean for a while"""
+        if self.prebuffer > Config.PLAYBACK_PREBUFFER_MIN and now - self.last_underrun > Config.PLAYBACK_PREBUFFER_DECAY:
+            self.prebuffer = max(self.prebuffer // 2, Config.PLAYBACK_PREBUFFER_MIN)
+            self.last_underrun = now
+
     async def play_track(self, track):
         """Play audio from an aiortc audio track"""
-        print("🎵 Starting to play received audio track")
+        say("🎵 Starting to play received audio track")
         consecutive_errors = 0
         max_consecutive_errors = 3
+        convert = None
+        loop = asyncio.get_running_loop()
+        seen_underruns = self.underruns
         
         try:
             while self.is_playing:
                 try:
                     # Receive audio frame from the track
+                    wait_start = loop.time()
                     frame = await track.recv()
                     consecutive_errors = 0  # Reset error count on successful frame
                     
+                    # The device always runs dry during a pause in the remote audio
+                    # (between responses, at stream start) - only a starved ring while
+                    # frames are still flowing counts as an underrun
+                    now = loop.time()
+                    if now - wait_start > STREAM_GAP:
+                        self.primed = False  # Re-prime after a pause without counting an underrun
+                        seen_underruns = self.underruns
+                    elif self.underruns != seen_underruns and self.primed:
+                        seen_underruns = self.underruns
+                        self.primed = False
+                        self._on_underrun(now)
+                    else:
+                        seen_underruns = self.underruns
+                        self._maybe_shrink_prebuffer(now)
+                    
+                    if self.output_stream is None:
+                        self._open_output(frame.sample_rate, len(frame.layout.channels))
+                    
                     # Convert AudioFrame to numpy array
                     audio_array = frame.to_ndarray()
+                    if frame.format.is_planar and audio_array.shape[0] > 1:
+                        # Planar frames come back as one row per channel - PyAudio wants
+                        # interleaved samples, so view them as (samples, channels)
+                        audio_array = audio_array.T
                     
                     # Ensure it's the right format for PyAudio
-                    if audio_array.dtype != np.int16:
-                        # Normalize and convert to int16
-                        audio_array = (audio_array * 32767).astype(np.int16)
+                    if convert is None:
+                        convert = self._select_converter(audio_array)
+                    audio_array = convert(audio_array)
+                    if not audio_array.flags.c_contiguous:
+                        # A transposed int16 array is still strided - the ring needs
+                        # the interleaved samples as one buffer
+                        audio_array = np.ascontiguousarray(audio_array)
                     
-                    # Play the audio
+                    # Hand the PCM to the output callback. This is a memcpy into the
+                    # ring - PortAudio pulls it at the hardware cadence on its own
+                    # thread, so nothing here waits on the device.
                     if self.output_stream and self.is_playing:
-                        audio_bytes = audio_array.tobytes()
-                        self.output_stream.write(audio_bytes)
+                        dropped = self.ring.write(audio_array)
+                        if dropped:
+                            # The remote side is outrunning the device - keep latency
+                            # bounded by discarding the oldest audio instead
+                            self.dropped_bytes += dropped
+                            if now - self.last_drop_report >= Config.DROP_REPORT_INTERVAL:
+                                self._report_drops(now)
                         
-                except MediaStreamError:
-                    # Normal end-of-stream - OpenAI finished sending audio
-                    print("✅ Audio stream ended normally")
-                    break
-                    
-                except ConnectionError:
-                    # Connection closed normally - also end-of-stream
-                    print("✅ Audio connection closed normally") 
-                    break
-                    
-                except (OSError, BrokenPipeError, ConnectionResetError):
-                    # Network-related end-of-stream conditions
-                    print("✅ Audio network connection ended normally")
-                    break
-                    
-                except asyncio.TimeoutError:
-                    # Timeout waiting for next frame - normal end
-                    print("✅ Audio stream timeout (normal end)")
-                    break
-                    
-                except StopAsyncIteration:
-                    # Async iterator exhausted - normal end
-                    print("✅ Audio stream iteration complete")
+                        # Hold playback back until the pre-buffer is full, so a late
+                        # packet doesn't immediately starve the device
+                        if not self.primed and len(self.ring) >= self.prebuffer * audio_array.nbytes:
+                            self.primed = True
+                        
+                except _END_OF_STREAM as end:
+                    # Normal end-of-stream - OpenAI finished sending audio or the connection closed
+                    say(f"✅ Audio stream ended normally ({type(end).__name__})")
                     break
                     
                 except Exception as frame_error:
-                    # Check if it's an end-of-stream related error by message content
+                    # Last resort: recognise end-of-stream errors by message content
                     error_msg = str(frame_error).lower()
-                    if any(phrase in error_msg for phrase in [
-                        "connection closed", "stream ended", "eof", "end of file", 
-                        "no more data", "stream closed", "track ended"
-                    ]):
-                        print(f"✅ Audio stream ended normally: {frame_error}")
+                    if any(phrase in error_msg for phrase in _EOF_PHRASES):
+                        say(f"✅ Audio stream ended normally: {frame_error}")
                         break
                     
                     # Real errors - count these toward limit
                     consecutive_errors += 1
-                    print(f"⚠️ Audio frame error ({consecutive_errors}/{max_consecutive_errors}): {frame_error}")
+                    say(f"⚠️ Audio frame error ({consecutive_errors}/{max_consecutive_errors}): {frame_error}")
                     
                     if consecutive_errors >= max_consecutive_errors:
-                        print("❌ Too many consecutive audio errors, stopping playback")
+                        say("❌ Too many consecutive audio errors, stopping playback")
                         break
                     
                     # Brief pause before retrying
                     await asyncio.sleep(0.1)
                     
         except Exception as e:
-            print(f"❌ Error playing track: {e}")
+            say(f"❌ Error playing track: {e}")
         finally:
-            print("🔊 Track playback stopped")
\ No newline at end of file
+            say("🔊 Track playback stopped")
\ No newline at end of file
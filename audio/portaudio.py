@@ -0,0 +1,24 @@
+# audio/portaudio.py
+import atexit
+import pyaudio
+
+_pyaudio = None
+
+def get_pyaudio():
+    """
+    Return the process-wide PyAudio instance, creating it on first use.
+    Initializing PortAudio probes every host API, so it is done once and
+    shared by capture and playback - they only open and close streams.
+    """
+    global _pyaudio
+    if _pyaudio is None:
+        _pyaudio = pyaudio.PyAudio()
+        atexit.register(_terminate)
+    return _pyaudio
+
+def _terminate():
+    """Release PortAudio at interpreter exit."""
+    global _pyaudio
+    if _pyaudio is not None:
+        _pyaudio.terminate()
+        _pyaudio = None
@@ -0,0 +1,117 @@
+# audio/ring_buffer.py
+import threading
+
+class FrameRingBuffer:
+    """
+    A fixed-size single-producer/single-consumer ring of int16 audio blocks.
+
+    The producer (the PyAudio thread) only ever advances ``tail`` and the
+    consumer (``recv()`` on the event loop) only ever advances ``head``, so
+    no lock is needed: each index has exactly one writer, and a plain int
+    store is atomic under the GIL.
+
+    Slots are raw memoryviews over one preallocated bytearray, so blocks go
+    in and out with a plain memcpy and no per-block objects are created.
+    """
+
+    def __init__(self, capacity, block_size):
+        self.capacity = capacity
+        block_bytes = block_size * 2  # int16 samples
+        self.buffer = bytearray(capacity * block_bytes)
+        view = memoryview(self.buffer)
+        self.slots = [view[i * block_bytes:(i + 1) * block_bytes] for i in range(capacity)]
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def write(self, data):
+        """
+        Copy one block of raw int16 PCM into the next free slot.
+        Returns False (and drops the block) if the ring is full.
+        """
+        if self.tail - self.head >= self.capacity:
+            return False
+        self.slots[self.tail % self.capacity][:] = data
+        self.tail += 1
+        return True
+
+    def peek(self):
+        """Return the oldest unread slot without consuming it, or None if empty."""
+        if self.head == self.tail:
+            return None
+        return self.slots[self.head % self.capacity]
+
+    def advance(self):
+        """Release the slot returned by peek() back to the producer."""
+        self.head += 1
+
+class ByteRingBuffer:
+    """
+    A fixed-capacity FIFO of raw PCM bytes between ``play_track()`` and the
+    PortAudio output callback.
+
+    Unlike ``FrameRingBuffer`` the two sides don't agree on a block size (the
+    decoder hands over whatever a packet held, the device asks for
+    ``frame_count`` frames), so reads and writes are arbitrary-length copies.
+    Both sides move the fill level, which is why a lock is needed - it is
+    only ever held for a memcpy.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Offset of the oldest unread byte
+        self.size = 0  # Bytes currently buffered
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        with self.lock:
+            self.start = 0
+            self.size = 0
+
+    def write(self, data):
+        """
+        Append raw bytes (anything exposing a C-contiguous buffer). If the ring
+        is full the oldest bytes are overwritten - for live audio, late is worse
+        than lost. Returns the number of bytes dropped.
+        """
+        data = memoryview(data).cast('B')
+        dropped = 0
+        if len(data) > self.capacity:
+            dropped = len(data) - self.capacity
+            data = data[dropped:]
+        count = len(data)
+        with self.lock:
+            overflow = self.size + count - self.capacity
+            if overflow > 0:
+                self.start = (self.start + overflow) % self.capacity
+                self.size -= overflow
+                dropped += overflow
+            end = (self.start + self.size) % self.capacity
+            first = min(count, self.capacity - end)
+            self.view[end:end + first] = data[:first]
+            self.view[:count - first] = data[first:]
+            self.size += count
+        return dropped
+
+    def read(self, count):
+        """
+        Pop ``count`` bytes, zero-padded if fewer are buffered.
+        Returns ``(data, filled)`` where ``filled`` is the number of real bytes.
+        """
+        with self.lock:
+            filled = min(count, self.size)
+            first = min(filled, self.capacity - self.start)
+            parts = [self.view[self.start:self.start + first], self.view[:filled - first]]
+            if filled < count:
+                parts.append(bytes(count - filled))
+            data = b''.join(parts)
+            self.start = (self.start + filled) % self.capacity
+            self.size -= filled
+        return data, filled
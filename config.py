@@ -9,14 +9,31 @@ class Config:
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-realtime-preview')
     OPENAI_VOICE = os.getenv('OPENAI_VOICE', 'alloy')
     
+    # Logging Configuration
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()  # DEBUG shows per-frame audio diagnostics
+    DROP_REPORT_INTERVAL = 1.0  # seconds between repeated audio-overflow warnings
+    
     # Audio Configuration
-    SAMPLE_RATE = 8000  # PCMU codec uses 8kHz
-    CHUNK_SIZE = 1024
+    AUDIO_CODEC = os.getenv('AUDIO_CODEC', 'opus').lower()  # 'opus' (wideband) or 'pcmu' (G.711 narrowband)
+    SAMPLE_RATE = 8000 if AUDIO_CODEC == 'pcmu' else 48000  # capture at the codec's native rate
+    CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', SAMPLE_RATE // 50))  # 20 ms, one RTP packet
     CHANNELS = 1
     AUDIO_FORMAT = 'int16'
+    CAPTURE_RING_SIZE = 8  # blocks buffered between the PyAudio thread and recv()
+    FRAME_POOL_SIZE = 4  # outbound AudioFrames recycled by the microphone track
+    CAPTURE_STALL_FRAMES = 5  # frames without mic audio, while unmuted, before silence is sent
+    PLAYBACK_PREBUFFER_MIN = 2  # frames buffered before playback starts
+    PLAYBACK_PREBUFFER_MAX = 8  # upper bound after repeated underruns
+    PLAYBACK_PREBUFFER_DECAY = 5.0  # seconds without underruns before shrinking again
+    PLAYBACK_RING_SECONDS = 0.5  # audio held between play_track() and the output callback
+    
+    # Event loop: use uvloop when it is installed (not available on Windows)
+    USE_UVLOOP = os.getenv('USE_UVLOOP', '1') != '0'
     
     # WebRTC Configuration
-    STUN_SERVER = 'stun:stun.l.google.com:19302'
+    # Empty disables STUN: only host candidates are gathered, skipping the STUN
+    # round trip before the offer can be sent (fine when not behind a strict NAT)
+    STUN_SERVER = os.getenv('STUN_SERVER', 'stun:stun.l.google.com:19302')
     
     # Voice Activity Detection
     VAD_THRESHOLD = 0.001  # Lowered from 0.01 to be more sensitive
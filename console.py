@@ -0,0 +1,55 @@
+# console.py
+import atexit
+import queue
+import sys
+import threading
+
+# Lines waiting for the writer thread. A console write can block for
+# milliseconds (notably on Windows), so the event loop never does it itself.
+_lines = queue.SimpleQueue()
+_writer = None
+
+def _write(text):
+    """Write one line, degrading rather than raising - a dead writer would leave say() queueing forever."""
+    try:
+        sys.stdout.write(text)
+    except UnicodeEncodeError:
+        # e.g. emoji on an ASCII or cp1252 console/redirect
+        encoding = sys.stdout.encoding or 'ascii'
+        try:
+            sys.stdout.write(text.encode(encoding, errors='replace').decode(encoding))
+        except Exception:
+            pass
+    except Exception:
+        pass  # Closed pipe or similar - drop the line
+
+def _flush():
+    try:
+        sys.stdout.flush()
+    except Exception:
+        pass
+
+def _run():
+    while True:
+        text = _lines.get()
+        if text is None:
+            break
+        _write(text)
+        if _lines.empty():
+            _flush()
+    _flush()
+
+def _shutdown():
+    """Flush whatever is still queued before the interpreter exits."""
+    if _writer is not None:
+        _lines.put(None)
+        _writer.join(timeout=1)
+
+def say(*args, sep=' ', end='\n'):
+    """Drop-in for print() that hands the text to a background writer thread."""
+    global _writer
+    if _writer is None:
+        _writer = threading.Thread(target=_run, name="console-writer", daemon=True)
+        _writer.start()
+        atexit.register(_shutdown)
+    _lines.put(sep.join(map(str, args)) + end)
@@ -1,11 +1,13 @@
 # main.py
 import asyncio
+import logging
 import signal
 import sys
 import traceback
 from audio.capture import AudioCapture
 from openai_client.client import OpenAIRealtimeClient
 from config import Config
+from console import say
 
 class VoiceAgent:
     def __init__(self):
@@ -15,11 +17,11 @@ class VoiceAgent:
 
     async def start(self):
         """Initialize and start the voice agent."""
-        print("🚀 Starting Voice Agent...")
+        say("🚀 Starting Voice Agent...")
         
         # Check API key first
         if not Config.OPENAI_API_KEY:
-            print("❌ OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
+            say("❌ OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
             return
         
         try:
@@ -29,63 +31,83 @@ class VoiceAgent:
             # Initialize OpenAI client
             self.openai_client = OpenAIRealtimeClient()
             
-            # 1. Create OpenAI session first to get credentials
-            session_created = await self.openai_client.create_session()
+            # 1. Start capturing audio from the microphone (muted until SPACE is held)
+            track = await self.audio_capture.start_recording()
+            
+            # 2. Create the OpenAI session and the WebRTC offer concurrently - the
+            #    offer doesn't need credentials, so ICE gathering overlaps the request
+            session_created, offer_ready = await asyncio.gather(
+                self.openai_client.create_session(),
+                self.openai_client.create_offer(track),
+            )
             if not session_created:
-                print("❌ Failed to create OpenAI session - stopping.")
+                say("❌ Failed to create OpenAI session - stopping.")
+                await self._shutdown()
+                return
+            if not offer_ready:
+                say("❌ Failed to set up WebRTC connection - stopping.")
+                await self._shutdown()
                 return
-            
-            # 2. Start capturing audio from the microphone
-            track = await self.audio_capture.start_recording()
             
             # 3. Connect the WebRTC client using session credentials
-            connection_success = await self.openai_client.connect(track)
+            connection_success = await self.openai_client.connect()
             if not connection_success:
-                print("❌ Failed to connect to OpenAI - stopping.")
-                await self.stop()
+                say("❌ Failed to connect to OpenAI - stopping.")
+                await self._shutdown()
                 return
             
             # 4. Wait for the WebRTC session to be established
             session_ready = await self.openai_client.wait_for_session()
             if not session_ready:
-                print("❌ Failed to establish session - stopping.")
-                await self.stop()
+                say("❌ Failed to establish session - stopping.")
+                await self._shutdown()
                 return
             
             self.is_running = True
-            print("✅ Voice Agent started successfully!")
+            say("✅ Voice Agent started successfully!")
             
             # Keep the agent running
             try:
                 while self.is_running:
                     await asyncio.sleep(0.1)
             except KeyboardInterrupt:
-                print("\n🛑 Interrupted by user")
+                say("\n🛑 Interrupted by user")
                 
         except Exception as e:
-            print(f"❌ Error starting Voice Agent: {e}")
+            say(f"❌ Error starting Voice Agent: {e}")
             traceback.print_exc()
+            # Clean up here rather than in stop(), which only acts once running
+            self.is_running = False
+            await self._shutdown()
             raise
 
     async def stop(self):
         """Gracefully stop the voice agent and all its components."""
         # Check is_running to prevent stop from being called multiple times.
         if self.is_running:
-            print("\n🛑 Stopping Voice Agent...")
+            say("\n🛑 Stopping Voice Agent...")
             self.is_running = False
+            await self._shutdown()
+            say("✅ Voice Agent stopped.")
 
-            # Stop audio capture
-            await self.audio_capture.stop_recording()
-
-            # Disconnect the client (which also stops playback)
-            if self.openai_client:
-                await self.openai_client.disconnect()
-
-            print("✅ Voice Agent stopped.")
+    async def _shutdown(self):
+        """
+        Stop audio capture and disconnect the client (which also stops playback).
+        Safe on a partial start, so failed start-up steps use it directly.
+        """
+        # Side by side - neither waits on the other
+        steps = []
+        if self.audio_capture:
+            steps.append(self.audio_capture.stop_recording())
+        if self.openai_client:
+            steps.append(self.openai_client.disconnect())
+        for result in await asyncio.gather(*steps, return_exceptions=True):
+            if isinstance(result, Exception):
+                say(f"⚠️ Error during shutdown: {result}")
 
 async def signal_handler():
     """Handle shutdown signals gracefully."""
-    print("\n🔄 Graceful shutdown initiated...")
+    say("\n🔄 Graceful shutdown initiated...")
     # The main loop will handle cleanup
 
 async def main():
@@ -102,20 +124,40 @@ async def main():
     try:
         await agent.start()
     except KeyboardInterrupt:
-        print("\n🔄 Keyboard interrupt received")
+        say("\n🔄 Keyboard interrupt received")
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        say(f"❌ Unexpected error: {e}")
         traceback.print_exc()
     finally:
         await agent.stop()
-        print("👋 Voice Agent terminated.")
+        say("👋 Voice Agent terminated.")
+
+def setup_logging():
+    """Send the app's own diagnostics to the console at Config.LOG_LEVEL."""
+    # Keep third-party libraries (aiortc, aioice) at WARNING so they don't flood the console
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    for name in ("audio", "openai_client"):
+        logging.getLogger(name).setLevel(Config.LOG_LEVEL)
+
+def install_event_loop():
+    """Swap in uvloop's libuv-based loop when enabled and installed, else keep asyncio's default."""
+    if not Config.USE_UVLOOP or sys.platform == "win32":
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 if __name__ == "__main__":
-    print("🎤 Voice Agent with OpenAI Realtime API")
-    print("📝 Controls:")
-    print("   - Hold SPACEBAR to talk")
-    print("   - Release SPACEBAR when done speaking")
-    print("   - Press Ctrl+C to quit")
-    print("=" * 50)
+    setup_logging()
+    install_event_loop()
+    
+    say("🎤 Voice Agent with OpenAI Realtime API")
+    say("📝 Controls:")
+    say("   - Hold SPACEBAR to talk")
+    say("   - Release SPACEBAR when done speaking")
+    say("   - Press Ctrl+C to quit")
+    say("=" * 50)
     
     asyncio.run(main())
@@ -1,15 +1,37 @@
 # openai_client/client.py
 import asyncio
 import json
-import requests
+import aiohttp
 import keyboard
-from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc import RTCConfiguration, RTCIceServer, RTCPeerConnection, RTCRtpSender, RTCSessionDescription
 from config import Config
+from console import say
 from audio.playback import AudioPlayback
+import atexit
 import os
 import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
+try:
+    # Optional: several times faster than the stdlib on the event stream
+    import orjson
+    json_loads = orjson.loads
+
+    def json_pretty(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    json_loads = json.loads
+
+    def json_pretty(obj):
+        return json.dumps(obj, indent=2)
+
+logger = logging.getLogger(__name__)
+
 # Set up logging for OpenAI voice session
 LOG_DIR = "logs"
 LOG_FILE = "openai_voice_session.log"
@@ -19,37 +41,131 @@ os.makedirs(LOG_DIR, exist_ok=True)
 
 # Set up file logger
 log_file_path = os.path.join(LOG_DIR, LOG_FILE)
-file_handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8')
-file_handler.setLevel(logging.INFO)
+file_handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8', delay=True)
+file_handler.setLevel(logging.DEBUG)  # The logger's level decides what is written
 
 # Create formatter
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(formatter)
 
-# Create logger
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records as-is. The stock prepare() formats the message on the
+    calling thread, which would serialize LazyJSON payloads on the event loop.
+    """
+    def prepare(self, record):
+        return record
+
+# Create logger. Records are handed to a listener thread that does the
+# formatting and file writes, so a slow disk never stalls the event loop.
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # Drains anything still queued
+
 session_logger = logging.getLogger('openai_voice_session')
-session_logger.setLevel(logging.INFO)
-session_logger.addHandler(file_handler)
+session_logger.setLevel(logging.DEBUG if Config.LOG_LEVEL == 'DEBUG' else logging.INFO)
+session_logger.addHandler(DeferredQueueHandler(log_queue))
 
 # Prevent duplicate logs
 session_logger.propagate = False
 
+class LazyJSON:
+    """Defers pretty-printing a payload until a log handler actually formats the record"""
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json_pretty(self.obj)
+
 # Log session start
 session_logger.info("=" * 60)
 session_logger.info("NEW VOICE SESSION STARTED")
 session_logger.info("=" * 60)
 
-# Conversation state variables
-waiting_for_reply = False
-commit_received = False
-user_transcript = ""
-
 # Push-to-talk timing constants
 MUTE_GRACE = 0.1  # seconds to wait before muting after release
 VAD_WATCHDOG = 3.0  # seconds to wait for VAD before assuming it missed the audio
 
-# Additional state for mute timing
-mute_grace_start = None
+# Fallback SPACE polling rate when keyboard hooks aren't available (Windows only)
+KEY_POLL_INTERVAL = 0.005  # seconds - well under the 100 ms mute grace
+
+# ICE states that mean media will never flow
+ICE_FAILED_STATES = frozenset({"failed", "closed"})
+
+# Longest disconnect() waits for cancelled background tasks before moving on
+TEARDOWN_TIMEOUT = 2.0  # seconds
+
+# An event handler that holds the loop longer than this risks audible playback stutter
+EVENT_BUDGET_NS = 10_000_000  # 10 ms
+
+# Fixed control messages, serialized once at import. They stay str: aiortc sends
+# bytes as binary data-channel messages, which the API doesn't parse as events.
+RESPONSE_CREATE_MSG = json.dumps({"type": "response.create"})
+AUDIO_COMMIT_MSG = json.dumps({"type": "input_audio_buffer.commit"})
+GREETING_MSG = json.dumps({
+    "type": "conversation.item.create",
+    "item": {
+        "type": "message", 
+        "role": "user",
+        "content": [{"type": "input_text", "text": "Hello! I'm ready to have a voice conversation with you."}]
+    }
+})
+
+# Quoted so it only matches the event's "type" value, not transcript text
+TRANSCRIPT_DELTA_TAG = '"response.audio_transcript.delta"'
+
+# Fallback order behind the configured codec: wideband first, then G.711
+CODEC_PRIORITY = ("opus", "g722", "pcmu", "pcma")
+
+# codec name -> aiortc's audio capabilities sorted with that codec first
+# (None if aiortc doesn't offer it). The capability list is static.
+_codec_preferences = {}
+
+def _codecs_preferring(codec_name):
+    """Return the audio codec list in preference order, sorted once per codec name"""
+    if codec_name not in _codec_preferences:
+        priority = [codec_name] + [name for name in CODEC_PRIORITY if name != codec_name]
+        
+        def rank(codec):
+            mime = codec.mimeType.lower()
+            return next((i for i, name in enumerate(priority) if name in mime), len(priority))
+        
+        # sorted() is stable, so codecs not in the priority list keep aiortc's order
+        codecs = sorted(RTCRtpSender.getCapabilities('audio').codecs, key=rank)
+        _codec_preferences[codec_name] = codecs if codecs and rank(codecs[0]) == 0 else None
+    return _codec_preferences[codec_name]
+
+def _watch_space_win32(loop, key_events):
+    """
+    Fallback for when the keyboard library can't install its hook: poll
+    GetAsyncKeyState, which reads the key's hardware state directly, on a
+    dedicated thread and post edges to key_events. Returns a stop function.
+    """
+    import ctypes
+    get_async_key_state = ctypes.WinDLL('user32').GetAsyncKeyState
+    get_async_key_state.restype = ctypes.c_short
+    stop = threading.Event()
+
+    def _poll():
+        was_down = False
+        while not stop.wait(KEY_POLL_INTERVAL):
+            down = bool(get_async_key_state(0x20) & 0x8000)  # VK_SPACE, high bit = held
+            if down != was_down:
+                was_down = down
+                loop.call_soon_threadsafe(key_events.put_nowait, down)
+
+    threading.Thread(target=_poll, name="space-poll", daemon=True).start()
+    return stop.set
+
+def _sdp_summary(sdp, keep=5):
+    """First and last few lines of an SDP blob - enough to spot the codec and ICE setup"""
+    lines = sdp.splitlines()
+    if len(lines) <= keep * 2:
+        return sdp
+    return "\n".join(lines[:keep] + [f"...({len(lines) - keep * 2} more lines)..."] + lines[-keep:])
 
 def prefer_audio_codec(pc, codec_name):
     """Prefer a specific audio codec for WebRTC connection"""
@@ -59,127 +175,16 @@ def prefer_audio_codec(pc, codec_name):
         audio_transceiver = next((t for t in transceivers if t.kind == "audio"), None)
         
         if audio_transceiver and hasattr(audio_transceiver, 'setCodecPreferences'):
-            # Get available codecs
-            codecs = audio_transceiver.sender.getCapabilities('audio').codecs
-            
-            # Find the preferred codec
-            preferred_codec = next(
-                (c for c in codecs if codec_name.lower() in c.mimeType.lower()), 
-                None
-            )
-            
-            if preferred_codec:
-                # Move preferred codec to front
-                codecs.remove(preferred_codec)
-                codecs.insert(0, preferred_codec)
+            codecs = _codecs_preferring(codec_name)
+            if codecs:
                 audio_transceiver.setCodecPreferences(codecs)
-                print(f"🎵 Preferred codec set to: {codec_name}")
+                say(f"🎵 Preferred codec set to: {codec_name}")
             else:
-                print(f"⚠️ Codec {codec_name} not found in capabilities")
+                say(f"⚠️ Codec {codec_name} not found in capabilities")
         else:
-            print("⚠️ Audio transceiver not found or codec preferences not supported")
+            say("⚠️ Audio transceiver not found or codec preferences not supported")
     except Exception as e:
-        print(f"⚠️ Could not set codec preference: {e}")
-
-def check_missed_turn(mic_track, events_channel):
-    """Check if VAD missed the audio and push-to-talk needs to force a response"""
-    global waiting_for_reply, commit_received
-    
-    # Only intervene if we're still waiting and nothing has happened
-    if commit_received and not waiting_for_reply:
-        print("⚠️ VAD timeout - forcing response.create (OpenAI didn't detect speech automatically)")
-        session_logger.warning("VAD: Timeout occurred - forcing response.create")
-        request_answer(mic_track, events_channel)
-    else:
-        # Audio was already processed successfully, no need to intervene
-        session_logger.info("VAD: Timeout occurred but audio was already processed successfully")
-
-async def handle_push_to_talk(mic_track, events_channel):
-    """Handle push-to-talk functionality with spacebar"""
-    global waiting_for_reply, commit_received, user_transcript
-    
-    loop = asyncio.get_running_loop()
-    space_was_down = False
-    mute_timer = None
-    watchdog = None
-    speech_start_time = None
-    
-    print("🎹 Push-to-talk ready! Press and hold SPACE to speak.")
-    session_logger.info("SYSTEM: Push-to-talk ready")
-    
-    while True:
-        try:
-            space_down = keyboard.is_pressed("space")
-            
-            # ── SPACE pressed (edge) ───────────────────────────────────────
-            if space_down and not space_was_down:
-                # Cancel pending timers (user resumed speaking)
-                if mute_timer:
-                    mute_timer.cancel()
-                    mute_timer = None
-                if watchdog:
-                    watchdog.cancel()
-                    watchdog = None
-
-                if not waiting_for_reply:
-                    mic_track.suspend(False)
-                    speech_start_time = loop.time()
-                    user_transcript = ""  # Reset transcript for new input
-                    print("🎙️ SPACE pressed → Recording your speech...")
-                    print("🎤 Speak now! Release SPACE when done.")
-                    session_logger.info("USER_INPUT: Started speaking (spacebar pressed)")
-
-            # ── SPACE released (edge) ──────────────────────────────────────
-            elif not space_down and space_was_down:
-                if not mic_track.suspended and speech_start_time:  
-                    speech_duration = loop.time() - speech_start_time
-                    print(f"🔇 SPACE released → Speech recorded ({speech_duration:.1f}s)")
-                    session_logger.info(f"USER_INPUT: Stopped speaking (spacebar released) - Duration: {speech_duration:.1f}s")
-                    
-                    def _on_mute():
-                        mic_track.suspend(True)
-                        print("🔇 Microphone muted - processing your speech...")
-                        
-                        # Send input_audio_buffer.commit to signal end of input
-                        if events_channel and events_channel.readyState == "open":
-                            events_channel.send(json.dumps({"type": "input_audio_buffer.commit"}))
-                            print("📤 Audio buffer committed to OpenAI")
-                            session_logger.info("USER_INPUT: Audio buffer committed to OpenAI")
-
-                        # Start watchdog in case VAD doesn't process the audio
-                        nonlocal watchdog
-                        watchdog = loop.call_later(
-                            VAD_WATCHDOG, check_missed_turn, mic_track, events_channel
-                        )
-
-                    mute_timer = loop.call_later(MUTE_GRACE, _on_mute)
-                    speech_start_time = None
-
-            space_was_down = space_down
-            await asyncio.sleep(0.05)  # Check every 50ms
-            
-        except Exception as e:
-            error_msg = f"Push-to-talk error: {e}"
-            print(f"⚠️ {error_msg}")
-            session_logger.error(f"PUSH_TO_TALK: {error_msg}")
-            await asyncio.sleep(0.1)
-
-def request_answer(mic_track, events_channel):
-    """
-    Fire 'response.create' once both:
-      • audio buffer committed (commit_received)
-      • mic is muted (user released SPACE)
-    """
-    global waiting_for_reply, commit_received
-
-    print(f"🔔 Checking conditions: suspended={mic_track.suspended}, commit={commit_received}, waiting={waiting_for_reply}")
-
-    if mic_track.suspended and commit_received and not waiting_for_reply:
-        print("🔔 Conditions met - sending response.create")
-        if events_channel and events_channel.readyState == "open":
-            events_channel.send(json.dumps({"type": "response.create"}))
-            waiting_for_reply = True
-            commit_received = False
+        say(f"⚠️ Could not set codec preference: {e}")
 
 class OpenAIRealtimeClient:
     def __init__(self):
@@ -187,109 +192,273 @@ class OpenAIRealtimeClient:
         self.client_secret = None
         self.session_id = None
         self.events_channel = None
+        self.events_open = False  # Mirrors events_channel.readyState == "open"
         self.audio_playback = AudioPlayback()
         self.player_task = None
         self.is_connected = False
+        self.connection_result = None  # Future resolved True/False by create_offer()'s state handlers
         self.mic_track = None
         self.push_to_talk_task = None
+        self.background_tasks = set()  # Strong references so running tasks aren't garbage-collected
+        self.http = None  # aiohttp session shared by the session and SDP requests
+        self._receiving_transcript = False  # Between the first transcript delta and .done
+        
+        # Conversation state
+        self.waiting_for_reply = False
+        self.commit_received = False
+        self.commit_event = asyncio.Event()  # Set when OpenAI confirms the audio buffer commit
+        self.user_transcript = ""
+        
+    def _get_http(self):
+        """Return the shared HTTP session, creating it on first use (needs a running loop)"""
+        if self.http is None or self.http.closed:
+            self.http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+        return self.http
         
+    def _spawn(self, coro):
+        """Start a background task that disconnect() will cancel and wait for"""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+        
+    def check_missed_turn(self):
+        """Check if VAD missed the audio and push-to-talk needs to force a response"""
+        # Only intervene if we're still waiting and nothing has happened
+        if self.commit_received and not self.waiting_for_reply:
+            say("⚠️ VAD timeout - forcing response.create (OpenAI didn't detect speech automatically)")
+            session_logger.warning("VAD: Timeout occurred - forcing response.create")
+            self.request_answer()
+        else:
+            # Audio was already processed successfully, no need to intervene
+            session_logger.info("VAD: Timeout occurred but audio was already processed successfully")
+
+    async def handle_push_to_talk(self):
+        """Handle push-to-talk functionality with spacebar"""
+        mic_track = self.mic_track
+        loop = asyncio.get_running_loop()
+        key_events = asyncio.Queue()  # True on a SPACE press edge, False on release
+        hook_space_down = False  # Touched only on the keyboard hook thread
+        turn_task = None  # Mute-then-watchdog sequence for the turn just released
+        speech_start_time = None
+    
+        def _on_space(event):
+            # Runs on the keyboard library's hook thread. Holding a key auto-repeats
+            # key-down events, so only state changes are handed to the event loop.
+            nonlocal hook_space_down
+            space_down = event.event_type == keyboard.KEY_DOWN
+            if space_down != hook_space_down:
+                hook_space_down = space_down
+                loop.call_soon_threadsafe(key_events.put_nowait, space_down)
+    
+        try:
+            space_hook = keyboard.hook_key("space", _on_space)
+            stop_key_watch = lambda: keyboard.unhook(space_hook)
+        except Exception as e:
+            if sys.platform != "win32":
+                # Nothing to fall back to - say so, or SPACE just silently does nothing
+                # (on Linux the keyboard library needs root)
+                error_msg = f"Push-to-talk unavailable - could not hook SPACE: {e}"
+                say(f"❌ {error_msg}")
+                session_logger.error(f"PUSH_TO_TALK: {error_msg}")
+                return
+            say(f"⚠️ Keyboard hook unavailable ({e}) - polling SPACE instead")
+            stop_key_watch = _watch_space_win32(loop, key_events)
+    
+        say("🎹 Push-to-talk ready! Press and hold SPACE to speak.")
+        session_logger.info("SYSTEM: Push-to-talk ready")
+    
+        try:
+            while True:
+                try:
+                    # Sleeps until the OS reports a SPACE edge - no polling while idle
+                    space_down = await key_events.get()
+                
+                    # ── SPACE pressed (edge) ───────────────────────────────────────
+                    if space_down:
+                        # Cancel the pending mute/watchdog (user resumed speaking)
+                        if turn_task:
+                            turn_task.cancel()
+                            turn_task = None
+
+                        if not self.waiting_for_reply:
+                            mic_track.suspend(False)
+                            self.commit_event.clear()
+                            speech_start_time = loop.time()
+                            self.user_transcript = ""  # Reset transcript for new input
+                            say("🎙️ SPACE pressed → Recording your speech...")
+                            say("🎤 Speak now! Release SPACE when done.")
+                            session_logger.info("USER_INPUT: Started speaking (spacebar pressed)")
+
+                    # ── SPACE released (edge) ──────────────────────────────────────
+                    else:
+                        if not mic_track.suspended and speech_start_time:  
+                            speech_duration = loop.time() - speech_start_time
+                            say(f"🔇 SPACE released → Speech recorded ({speech_duration:.1f}s)")
+                            session_logger.info(f"USER_INPUT: Stopped speaking (spacebar released) - Duration: {speech_duration:.1f}s")
+                            turn_task = self._spawn(self._finish_turn())
+                            speech_start_time = None
+                
+                except Exception as e:
+                    error_msg = f"Push-to-talk error: {e}"
+                    say(f"⚠️ {error_msg}")
+                    session_logger.error(f"PUSH_TO_TALK: {error_msg}")
+                    await asyncio.sleep(0.1)
+        finally:
+            stop_key_watch()
+            if turn_task:
+                turn_task.cancel()
+
+    async def _finish_turn(self):
+        """
+        Runs after SPACE is released. One task covers the whole tail of the
+        turn, so pressing SPACE again cancels both steps at once.
+        """
+        await asyncio.sleep(MUTE_GRACE)
+        self.mic_track.suspend(True)
+        say("🔇 Microphone muted - processing your speech...")
+        
+        # Send input_audio_buffer.commit to signal end of input
+        if self.events_open:
+            self.events_channel.send(AUDIO_COMMIT_MSG)
+            say("📤 Audio buffer committed to OpenAI")
+            session_logger.info("USER_INPUT: Audio buffer committed to OpenAI")
+        
+        # Watchdog in case VAD doesn't process the audio. Wakes as soon as the commit
+        # lands rather than always sleeping out the full timeout.
+        try:
+            await asyncio.wait_for(self.commit_event.wait(), VAD_WATCHDOG)
+        except asyncio.TimeoutError:
+            self.check_missed_turn()
+            return
+        
+        # Commit confirmed. If it landed while the mic was still open (server VAD
+        # committing mid-utterance) the reply couldn't start then - start it now.
+        # No-op if the committed handler already sent response.create.
+        self.request_answer()
+
+    def request_answer(self):
+        """
+        Fire 'response.create' once both:
+          • audio buffer committed (commit_received)
+          • mic is muted (user released SPACE)
+        """
+        logger.debug("🔔 Checking conditions: suspended=%s, commit=%s, waiting=%s",
+                     self.mic_track.suspended, self.commit_received, self.waiting_for_reply)
+
+        if self.mic_track.suspended and self.commit_received and not self.waiting_for_reply:
+            logger.debug("🔔 Conditions met - sending response.create")
+            if self.events_open:
+                self.events_channel.send(RESPONSE_CREATE_MSG)
+                self.waiting_for_reply = True
+                self.commit_received = False
+
     async def create_session(self):
         """Step 1: Create session with OpenAI API to get credentials"""
-        print("📞 Creating OpenAI Realtime session...")
+        say("📞 Creating OpenAI Realtime session...")
         session_logger.info("SESSION: Creating OpenAI Realtime session")
         
         try:
-            response = requests.post(
+            session_config = {
+                "model": Config.OPENAI_MODEL,
+                "voice": Config.OPENAI_VOICE,
+                "instructions": "You are a helpful assistant. Keep responses concise and natural.",
+                "input_audio_transcription": {
+                    "model": "whisper-1"
+                },
+                "turn_detection": {
+                    "type": "server_vad",
+                    "threshold": 0.5,
+                    "prefix_padding_ms": 300,
+                    "silence_duration_ms": 2000,  # Longer silence to reduce interference with push-to-talk
+                    "create_response": False  # Don't auto-create responses - let push-to-talk handle it
+                },
+            }
+            if Config.AUDIO_CODEC == "pcmu":
+                # Keep the API on G.711 end to end so nothing is transcoded. With Opus the
+                # codec is negotiated over WebRTC and these fields don't apply.
+                session_config["input_audio_format"] = "g711_ulaw"
+                session_config["output_audio_format"] = "g711_ulaw"
+            
+            async with self._get_http().post(
                 "https://api.openai.com/v1/realtime/sessions",
                 headers={
                     "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
                     "Content-Type": "application/json",
                 },
-                json={
-                    "model": Config.OPENAI_MODEL,
-                    "voice": Config.OPENAI_VOICE,
-                    "instructions": "You are a helpful assistant. Keep responses concise and natural.",
-                    "input_audio_transcription": {
-                        "model": "whisper-1"
-                    },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 2000,  # Longer silence to reduce interference with push-to-talk
-                        "create_response": False  # Don't auto-create responses - let push-to-talk handle it
-                    },
-                    "input_audio_format": "g711_ulaw",  # PCMU format for WebRTC compatibility  
-                    "output_audio_format": "g711_ulaw"  # PCMU format for WebRTC compatibility
-                },
-                timeout=20,
-            )
+                json=session_config,
+            ) as response:
+                if response.status not in [200, 201]:
+                    error_msg = f"Failed to create session: {response.status} {await response.text()}"
+                    say(f"❌ {error_msg}")
+                    session_logger.error(f"SESSION: {error_msg}")
+                    return False
+                    
+                session_data = await response.json()
             
-            if response.status_code not in [200, 201]:
-                error_msg = f"Failed to create session: {response.status_code} {response.text}"
-                print(f"❌ {error_msg}")
-                session_logger.error(f"SESSION: {error_msg}")
-                return False
-                
-            session_data = response.json()
             self.client_secret = session_data["client_secret"]["value"]
             self.session_id = session_data["id"]
             
-            print("✅ OpenAI session created successfully")
-            print(f"🆔 Session ID: {self.session_id}")
+            say("✅ OpenAI session created successfully")
+            say(f"🆔 Session ID: {self.session_id}")
             
             session_logger.info(f"SESSION: Created successfully - ID: {self.session_id}")
-            session_logger.info(f"SESSION_RESPONSE: {json.dumps(session_data, indent=2)}")
+            session_logger.info("SESSION_RESPONSE: %s", LazyJSON(session_data))
             return True
             
         except Exception as e:
             error_msg = f"Error creating session: {e}"
-            print(f"❌ {error_msg}")
+            say(f"❌ {error_msg}")
             session_logger.error(f"SESSION: {error_msg}")
             return False
 
-    async def connect(self, microphone_track):
-        """Step 2: Create WebRTC connection using session credentials"""
-        print("🔗 Setting up WebRTC connection to OpenAI...")
+    async def create_offer(self, microphone_track):
+        """
+        Step 2: Build the peer connection and gather the local SDP offer.
+        Needs no session credentials, so it can run alongside create_session().
+        """
+        say("🔗 Setting up WebRTC connection to OpenAI...")
         
         try:
             # Store mic track reference for push-to-talk
             self.mic_track = microphone_track
             
-            # Create peer connection
-            self.pc = RTCPeerConnection()
+            # Resolved once, by whichever state handler settles first
+            self.connection_result = asyncio.get_running_loop().create_future()
+            
+            # Create peer connection. aiortc gathers every candidate before the offer
+            # goes out, so each ICE server adds a round trip to connection setup.
+            ice_servers = [RTCIceServer(urls=Config.STUN_SERVER)] if Config.STUN_SERVER else []
+            self.pc = RTCPeerConnection(RTCConfiguration(iceServers=ice_servers))
             
             # Add microphone track
             self.pc.addTrack(microphone_track)
-            print("🎤 Added microphone track")
+            say("🎤 Added microphone track")
             
-            # Prefer PCMU codec (important for OpenAI compatibility)
-            prefer_audio_codec(self.pc, "pcmu")
+            # Put the configured codec first (Opus by default, PCMU for narrowband)
+            prefer_audio_codec(self.pc, Config.AUDIO_CODEC)
             
             # Set up data channel for events BEFORE creating offer
             self.events_channel = self.pc.createDataChannel("oai-events")
             
             @self.events_channel.on("open")
             def on_events_open():
-                print("📡 Events channel opened")
+                say("📡 Events channel opened")
+                self.events_open = True
                 # Start push-to-talk handler
-                self.push_to_talk_task = asyncio.create_task(
-                    handle_push_to_talk(self.mic_track, self.events_channel)
-                )
-                
-                # Send initial greeting to start conversation
-                self.events_channel.send(json.dumps({
-                    "type": "conversation.item.create",
-                    "item": {
-                        "type": "message", 
-                        "role": "user",
-                        "content": [{"type": "input_text", "text": "Hello! I'm ready to have a voice conversation with you."}]
-                    }
-                }))
-                self.events_channel.send(json.dumps({"type": "response.create"}))
+                self.push_to_talk_task = self._spawn(self.handle_push_to_talk())
                 
-                global waiting_for_reply
-                waiting_for_reply = True
+                # Send initial greeting to start conversation. The API takes exactly one
+                # JSON event per data-channel message, so these can't be merged - but they
+                # are queued back-to-back in the same tick and go out together.
+                self.events_channel.send(GREETING_MSG)
+                self.events_channel.send(RESPONSE_CREATE_MSG)
+                self.waiting_for_reply = True
+            
+            @self.events_channel.on("close")
+            def on_events_close():
+                self.events_open = False
+                say("📡 Events channel closed")
             
             @self.events_channel.on("message")
             def on_events_message(message):
@@ -298,187 +467,270 @@ class OpenAIRealtimeClient:
             # Set up audio track handling
             @self.pc.on("track")
             async def on_track(track):
-                print(f"📡 Received audio track: {track.kind}")
+                say(f"📡 Received audio track: {track.kind}")
                 if track.kind == "audio":
-                    print("🔊 Starting audio playback...")
+                    say("🔊 Starting audio playback...")
                     self.audio_playback.start_playback()
-                    self.player_task = asyncio.create_task(self.audio_playback.play_track(track))
+                    self.player_task = self._spawn(self.audio_playback.play_track(track))
             
             @self.pc.on("connectionstatechange")
             async def on_connectionstatechange():
-                print(f"🔗 Connection state: {self.pc.connectionState}")
-                if self.pc.connectionState == "connected":
+                state = self.pc.connectionState
+                say(f"🔗 Connection state: {state}")
+                if state == "connected":
                     self.is_connected = True
-                    print("✅ WebRTC connection established!")
-                elif self.pc.connectionState == "failed":
-                    print("❌ WebRTC connection failed!")
+                    say("✅ WebRTC connection established!")
+                    self._settle_connection(True)
+                elif state == "failed":
+                    say("❌ WebRTC connection failed!")
+                    self._settle_connection(False)
             
-            # Create offer
+            @self.pc.on("iceconnectionstatechange")
+            async def on_iceconnectionstatechange():
+                # An ICE failure is final and lands before DTLS would give up, so
+                # report it early. Success waits for connectionState "connected":
+                # ICE can connect and DTLS still fail, leaving no SRTP.
+                state = self.pc.iceConnectionState
+                if state in ICE_FAILED_STATES:
+                    say(f"❌ ICE connection {state}!")
+                    self._settle_connection(False)
+            
+            # Create offer - this is where ICE candidates are gathered
             offer = await self.pc.createOffer()
             await self.pc.setLocalDescription(offer)
+            return True
             
-            print("📤 Sending SDP offer to OpenAI...")
-            print(f"📝 Local SDP:\n{self.pc.localDescription.sdp}")
+        except Exception as e:
+            say(f"❌ Error setting up WebRTC connection: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    async def connect(self):
+        """Step 3: Exchange the offer from create_offer() for OpenAI's answer using session credentials"""
+        try:
+            local_sdp = self.pc.localDescription.sdp
+            say(f"📤 Sending SDP offer to OpenAI ({len(local_sdp)} bytes)...")
+            say(f"📝 Local SDP summary:\n{_sdp_summary(local_sdp)}")
+            session_logger.debug("LOCAL_SDP:\n%s", local_sdp)
             
-            # Send SDP to OpenAI - Note: expects 201 response, not 200
-            response = requests.post(
+            # Send SDP to OpenAI - Note: expects 201 response, not 200.
+            # Reuses the connection already opened by create_session().
+            async with self._get_http().post(
                 f"https://api.openai.com/v1/realtime?model={Config.OPENAI_MODEL}",
                 headers={
                     "Authorization": f"Bearer {self.client_secret}",
                     "Content-Type": "application/sdp"
                 },
-                data=self.pc.localDescription.sdp,
-                timeout=20
-            )
-            
-            # Check for success (201 is expected for SDP exchange)
-            if response.status_code not in [200, 201]:
-                print(f"❌ SDP exchange failed: {response.status_code} {response.text}")
-                return False
+                data=local_sdp.encode('utf-8'),
+            ) as response:
+                # Check for success (201 is expected for SDP exchange)
+                if response.status not in [200, 201]:
+                    say(f"❌ SDP exchange failed: {response.status} {await response.text()}")
+                    return False
+                
+                answer_sdp = await response.text()
             
             # Set remote description
-            answer_sdp = response.text
-            print(f"📝 Remote SDP:\n{answer_sdp}")
+            say(f"📝 Received SDP answer ({len(answer_sdp)} bytes)")
+            say(f"📝 Remote SDP summary:\n{_sdp_summary(answer_sdp)}")
+            session_logger.debug("REMOTE_SDP:\n%s", answer_sdp)
             
             await self.pc.setRemoteDescription(RTCSessionDescription(answer_sdp, "answer"))
             
-            print("✅ SDP exchange completed successfully!")
+            say("✅ SDP exchange completed successfully!")
             return True
             
         except Exception as e:
-            print(f"❌ Error connecting to OpenAI: {e}")
+            say(f"❌ Error connecting to OpenAI: {e}")
             import traceback
             traceback.print_exc()
             return False
 
     def _handle_event(self, message):
         """Handle events from OpenAI"""
-        global waiting_for_reply, commit_received, user_transcript
+        # Transcript deltas stream in many times per response and only the first
+        # one does anything - skip the rest before paying for a JSON parse. The
+        # full text still arrives (and is logged) with response.audio_transcript.done.
+        if self._receiving_transcript and isinstance(message, str) and TRANSCRIPT_DELTA_TAG in message:
+            return
         
         try:
-            event = json.loads(message)
+            event = json_loads(message)
             event_type = event.get("type", "")
             
-            # Log all events to file
-            session_logger.info(f"EVENT: {event_type}")
-            session_logger.info(f"EVENT_DATA: {json.dumps(event, indent=2)}")
-            
-            # Reduce noise from repetitive events
-            if event_type in ["response.audio_transcript.delta", "conversation.item.input_audio_transcription.delta"]:
-                # Don't log these repetitive events individually
-                pass
+            # Log events to file as one record, serialized only if it is written.
+            # Streamed deltas go out at DEBUG, below the session log's level.
+            if event_type in self._QUIET_EVENTS:
+                session_logger.debug("EVENT: %s\nEVENT_DATA: %s", event_type, LazyJSON(event))
             else:
-                print(f"📨 Event: {event_type}")
+                session_logger.info("EVENT: %s\nEVENT_DATA: %s", event_type, LazyJSON(event))
+                # Per-event console trace is debug-only; repetitive events are never echoed
+                logger.debug("📨 Event: %s", event_type)
             
-            if event_type == "error":
-                error_msg = f"OpenAI error: {json.dumps(event, indent=2)}"
-                print(f"❌ {error_msg}")
-                session_logger.error(error_msg)
-            elif event_type == "input_audio_buffer.started":
-                msg = "OpenAI started receiving your audio"
-                print(f"🎤 {msg}")
-                session_logger.info(f"AUDIO_INPUT: {msg}")
-            elif event_type == "input_audio_buffer.committed":
-                msg = "Your audio was successfully received by OpenAI"
-                print(f"✅ {msg}")
-                session_logger.info(f"AUDIO_INPUT: {msg}")
-                commit_received = True
-                request_answer(self.mic_track, self.events_channel)
-            elif event_type == "conversation.item.input_audio_transcription.completed":
-                # This shows what OpenAI heard from the user
-                transcript = event.get("transcript", "")
-                if transcript.strip():
-                    msg = f'You said: "{transcript}"'
-                    print(f"👤 {msg}")
-                    session_logger.info(f"USER_TRANSCRIPT: {transcript}")
-                    user_transcript = transcript
-                else:
-                    msg = "(OpenAI detected speech but couldn't transcribe it clearly)"
-                    print(f"👤 {msg}")
-                    session_logger.warning(f"USER_TRANSCRIPT: Failed to transcribe clearly")
-            elif event_type == "conversation.item.input_audio_transcription.failed":
-                msg = "OpenAI couldn't transcribe your speech - try speaking more clearly"
-                print(f"⚠️ {msg}")
-                session_logger.warning(f"USER_TRANSCRIPT: {msg}")
-            elif event_type == "response.output_item.added":
-                msg = "Assistant is preparing response..."
-                print(f"💬 {msg}")
-                session_logger.info(f"ASSISTANT: {msg}")
-                # Ensure mic is muted when assistant speaks
-                if self.mic_track:
-                    self.mic_track.suspend(True)
-            elif event_type == "output_audio_buffer.started":
-                msg = "Assistant is speaking..."
-                print(f"🔊 {msg}")
-                session_logger.info(f"ASSISTANT: {msg}")
-            elif event_type == "response.audio_transcript.delta":
-                # Don't print each delta to reduce noise
-                if not hasattr(self, '_receiving_transcript'):
-                    print("📝 Receiving assistant response...")
-                    session_logger.info("ASSISTANT: Starting to receive response transcript")
-                    self._receiving_transcript = True
-            elif event_type == "response.audio_transcript.done":
-                # Extract and display the assistant's transcript
-                transcript = event.get("transcript", "")
-                if transcript.strip():
-                    print(f"🤖 Assistant said: \"{transcript}\"")
-                    session_logger.info(f"ASSISTANT_TRANSCRIPT: {transcript}")
-                
-                msg = "Assistant response complete"
-                print(f"📝 {msg}")
-                session_logger.info(f"ASSISTANT: {msg}")
-                if hasattr(self, '_receiving_transcript'):
-                    del self._receiving_transcript
-            elif event_type == "response.done":
-                msg = "Response generation complete"
-                print(f"✅ {msg}")
-                session_logger.info(f"ASSISTANT: {msg}")
-            elif event_type == "output_audio_buffer.stopped":
-                msg = "Assistant finished speaking"
-                print(f"🏁 {msg}")
-                session_logger.info(f"ASSISTANT: {msg}")
-                # Reset conversation state
-                waiting_for_reply = False
-                commit_received = False
-                print("🎙️ Ready for your next input (press and hold SPACE to speak)")
-                session_logger.info("SYSTEM: Ready for next user input")
+            handler = self._HANDLERS.get(event_type)
+            if handler:
+                start = time.perf_counter_ns()
+                try:
+                    handler(self, event)
+                finally:
+                    elapsed = time.perf_counter_ns() - start
+                    if elapsed > EVENT_BUDGET_NS:
+                        logger.warning("Slow event handler %s: %.2f ms", event_type, elapsed / 1e6)
                 
         except Exception as e:
-            print(f"⚠️ Error handling event: {e}")
+            say(f"⚠️ Error handling event: {e}")
+
+    def _on_error(self, event):
+        error_msg = f"OpenAI error: {json_pretty(event)}"
+        say(f"❌ {error_msg}")
+        session_logger.error(error_msg)
+
+    def _on_input_started(self, event):
+        msg = "OpenAI started receiving your audio"
+        say(f"🎤 {msg}")
+        session_logger.info(f"AUDIO_INPUT: {msg}")
+
+    def _on_input_committed(self, event):
+        msg = "Your audio was successfully received by OpenAI"
+        say(f"✅ {msg}")
+        session_logger.info(f"AUDIO_INPUT: {msg}")
+        self.commit_received = True
+        self.commit_event.set()
+        self.request_answer()
+
+    def _on_input_transcript(self, event):
+        # This shows what OpenAI heard from the user
+        transcript = event.get("transcript", "")
+        if transcript.strip():
+            msg = f'You said: "{transcript}"'
+            say(f"👤 {msg}")
+            session_logger.info(f"USER_TRANSCRIPT: {transcript}")
+            self.user_transcript = transcript
+        else:
+            msg = "(OpenAI detected speech but couldn't transcribe it clearly)"
+            say(f"👤 {msg}")
+            session_logger.warning(f"USER_TRANSCRIPT: Failed to transcribe clearly")
+
+    def _on_input_transcript_failed(self, event):
+        msg = "OpenAI couldn't transcribe your speech - try speaking more clearly"
+        say(f"⚠️ {msg}")
+        session_logger.warning(f"USER_TRANSCRIPT: {msg}")
+
+    def _on_output_item(self, event):
+        msg = "Assistant is preparing response..."
+        say(f"💬 {msg}")
+        session_logger.info(f"ASSISTANT: {msg}")
+        # Ensure mic is muted when assistant speaks
+        if self.mic_track:
+            self.mic_track.suspend(True)
+
+    def _on_output_started(self, event):
+        msg = "Assistant is speaking..."
+        say(f"🔊 {msg}")
+        session_logger.info(f"ASSISTANT: {msg}")
+
+    def _on_transcript_delta(self, event):
+        # Don't print each delta to reduce noise
+        if not self._receiving_transcript:
+            say("📝 Receiving assistant response...")
+            session_logger.info("ASSISTANT: Starting to receive response transcript")
+            self._receiving_transcript = True
+
+    def _on_transcript_done(self, event):
+        # Extract and display the assistant's transcript
+        transcript = event.get("transcript", "")
+        if transcript.strip():
+            say(f"🤖 Assistant said: \"{transcript}\"")
+            session_logger.info(f"ASSISTANT_TRANSCRIPT: {transcript}")
+        
+        msg = "Assistant response complete"
+        say(f"📝 {msg}")
+        session_logger.info(f"ASSISTANT: {msg}")
+        self._receiving_transcript = False
+
+    def _on_response_done(self, event):
+        msg = "Response generation complete"
+        say(f"✅ {msg}")
+        session_logger.info(f"ASSISTANT: {msg}")
+
+    def _on_output_stopped(self, event):
+        msg = "Assistant finished speaking"
+        say(f"🏁 {msg}")
+        session_logger.info(f"ASSISTANT: {msg}")
+        # Reset conversation state
+        self.waiting_for_reply = False
+        self.commit_received = False
+        say("🎙️ Ready for your next input (press and hold SPACE to speak)")
+        session_logger.info("SYSTEM: Ready for next user input")
+
+    # Event type -> handler, looked up once per event instead of walking an if/elif chain
+    _HANDLERS = {
+        "error": _on_error,
+        "input_audio_buffer.started": _on_input_started,
+        "input_audio_buffer.committed": _on_input_committed,
+        "conversation.item.input_audio_transcription.completed": _on_input_transcript,
+        "conversation.item.input_audio_transcription.failed": _on_input_transcript_failed,
+        "response.output_item.added": _on_output_item,
+        "output_audio_buffer.started": _on_output_started,
+        "response.audio_transcript.delta": _on_transcript_delta,
+        "response.audio_transcript.done": _on_transcript_done,
+        "response.done": _on_response_done,
+        "output_audio_buffer.stopped": _on_output_stopped,
+    }
+
+    # Streamed many times per response - not echoed to the console individually
+    _QUIET_EVENTS = frozenset({
+        "response.audio_transcript.delta",
+        "conversation.item.input_audio_transcription.delta",
+    })
+
+    def _settle_connection(self, ok):
+        """Report the connection outcome to wait_for_session() - only the first call counts"""
+        if self.connection_result is not None and not self.connection_result.done():
+            self.connection_result.set_result(ok)
 
     async def wait_for_session(self):
         """Wait for connection to be established"""
-        print("⏳ Waiting for WebRTC connection...")
+        say("⏳ Waiting for WebRTC connection...")
+        if self.connection_result is None:
+            return False  # create_offer() never got as far as creating the peer connection
         
-        # Wait for connection
-        for i in range(30):  # 30 second timeout
-            if self.is_connected:
-                print("✅ Session ready!")
-                return True
-            await asyncio.sleep(1)
+        # Resolved by the ICE/connection state handlers as soon as either settles,
+        # so a failure returns straight away instead of after the timeout
+        try:
+            connected = await asyncio.wait_for(self.connection_result, timeout=30)
+        except asyncio.TimeoutError:
+            say("❌ Connection timeout!")
+            return False
+        
+        if not connected:
+            return False
         
-        print("❌ Connection timeout!")
-        return False
+        say("✅ Session ready!")
+        return True
 
     async def disconnect(self):
         """Clean up and disconnect"""
         session_logger.info("SESSION: Disconnecting from OpenAI")
-        print("🛑 Disconnecting from OpenAI...")
+        say("🛑 Disconnecting from OpenAI...")
         
-        # Stop push-to-talk handler
-        if hasattr(self, 'push_to_talk_task') and self.push_to_talk_task:
-            self.push_to_talk_task.cancel()
-            try:
-                await self.push_to_talk_task
-            except asyncio.CancelledError:
-                pass
-        
-        if hasattr(self, 'player_task') and self.player_task:
-            self.player_task.cancel()
-            try:
-                await self.player_task
-            except asyncio.CancelledError:
-                pass
+        # Stop push-to-talk, the pending turn and track playback
+        tasks = list(self.background_tasks)
+        for task in tasks:
+            task.cancel()
+        try:
+            # A task stuck in a non-cancellable wait mustn't hold up shutdown
+            results = await asyncio.wait_for(
+                asyncio.gather(*tasks, return_exceptions=True), TEARDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            results = []
+            say(f"⚠️ Background tasks didn't stop within {TEARDOWN_TIMEOUT:.0f}s - continuing shutdown")
+            session_logger.warning("SESSION: Background tasks did not stop in time")
+        for result in results:
+            if isinstance(result, Exception):
+                say(f"⚠️ Background task failed: {result}")
+                session_logger.error(f"SESSION: Background task failed: {result}")
                 
         if self.audio_playback:
             self.audio_playback.stop_playback()
@@ -486,9 +738,13 @@ class OpenAIRealtimeClient:
         
         if self.pc:
             await self.pc.close()
-            print("🔌 WebRTC connection closed")
+            say("🔌 WebRTC connection closed")
             session_logger.info("SESSION: WebRTC connection closed")
         
+        if self.http:
+            await self.http.close()
+            self.http = None
+        
         session_logger.info("SESSION: Disconnection complete")
         session_logger.info("=" * 60)
         session_logger.info("VOICE SESSION ENDED")